@@ -10,7 +10,12 @@ import argparse
 from tqdm import tqdm
 import yaml
 import json
-from time import sleep
+import hashlib
+import io
+import csv
+import sqlite3
+import gzip
+from time import sleep, time_ns, monotonic, perf_counter, strftime
 
 def parse_arguments():
     def dir_path(path):
@@ -18,6 +23,12 @@ def parse_arguments():
             return path
         else:
             raise argparse.ArgumentTypeError(f"readable_dir:{path} is not a valid path")
+
+    def export_path(path):
+        if path.lower().endswith((".csv", ".db", ".sqlite", ".sqlite3")):
+            return path
+        else:
+            raise argparse.ArgumentTypeError(f"{path} must end with .csv for CSV or .db/.sqlite/.sqlite3 for SQLite")
     
     parser = argparse.ArgumentParser(description='Scan for .mkv and .nfo files in subdirectories and set file title, track names, languages and flags.')
     parser.add_argument('-d', '--directory',
@@ -28,8 +39,38 @@ def parse_arguments():
                         help='Don\'t append Sub formats " (SRT)" etc. to the subtitle track names.')
     parser.add_argument('--no_renaming', action='store_true',
                         help='Don\'t rename .mkv files to match .nfo files and don\'t trim " (1)" etc. from .mkv names')
+    parser.add_argument('--dry_run_renames', action='store_true',
+                        help='Only list the planned renames and the renames that would be skipped, then exit.')
+    parser.add_argument('--undo_renames', metavar="LOG",
+                        help='Revert the renames recorded in LOG (written to the cache directory whenever files are renamed), then exit.')
     parser.add_argument('--no_auto_flags', action='store_true',
                         help='When using "-" to skip a track, don\'t add forced/hearing impaired/commentary flags based on the track name')
+    parser.add_argument('--coarse', action='store_true',
+                        help='Group files only by track count, codec and language per track type, ignoring track names and flags.')
+    parser.add_argument('--order', choices=["scan", "size", "path"], default="scan",
+                        help='Order in which groups are prompted: in scan order (default), largest groups first or by path of the first file.')
+    parser.add_argument('--find', action='append', default=[], metavar="TEXT",
+                        help='Only prompt groups with a track language or codec equal to TEXT or a file path containing TEXT, can be used multiple times.')
+    parser.add_argument('--fingerprint', action='store_true',
+                        help='Only probe one file per identical set of track headers and reuse its track information for the others.')
+    parser.add_argument('--background', action='store_true',
+                        help='Run mkvmerge/mkvpropedit at idle priority, throttle them and pause while the system is busy (see "background_" settings in the config).')
+    parser.add_argument('--export', action='append', default=[], type=export_path, metavar="FILE",
+                        help='Write one row per track of every .mkv file to FILE (.csv or .db/.sqlite/.sqlite3) instead of editing, can be used multiple times.')
+    parser.add_argument('--snapshot_out', metavar="FILE",
+                        help='Scan, write the scan result to FILE and exit, to prompt on another machine via --snapshot_in.')
+    parser.add_argument('--snapshot_in', metavar="FILE",
+                        help='Prompt from a snapshot written by --snapshot_out without reading or editing any file, the answers are recorded for --apply_answers.')
+    parser.add_argument('--answers', metavar="FILE",
+                        help='Where --snapshot_in records the answers, default is the snapshot path with ".answers.json" appended.')
+    parser.add_argument('--apply_answers', metavar="FILE",
+                        help='Scan and apply the answers recorded via --snapshot_in to all files that still have the same tracks, then exit.')
+    parser.add_argument('--low_memory', action='store_true',
+                        help='Keep the per-file scan results in a temporary on-disk database instead of in memory, for very large libraries.')
+    parser.add_argument('--no_probe_cache', action='store_true',
+                        help='Don\'t use or update the probe cache, probe every file again.')
+    parser.add_argument('--no_dir_index', action='store_true',
+                        help='Don\'t use or update the directory index, list every directory again.')
 
     args: argparse.Namespace = parser.parse_args()
 
@@ -97,6 +138,41 @@ pattern_movie = re.compile(config["pattern_movie"]) if config["pattern_movie"] !
 # regular expression to check if the format is already appended to the track name
 pattern_sub = re.compile(config["pattern_sub"]) if config["pattern_sub"] != "" else re.compile(r'^(.*) (?:\(?SRT\)?|\(?ASS\)?|\(?VOB\)?|\(?PGS\)?)$')
                 
+# Group files only by track count, codec and language per track type, can be enabled with --coarse
+coarse_grouping_cfg = config.get("coarse_grouping", False)
+
+# Reuse the track information of files with identical track headers instead of probing each file, can be enabled with --fingerprint
+fingerprint_tracks_cfg = config.get("fingerprint_tracks", False)
+
+# Limits used with --background, 0 disables a limit
+background_max_files_per_second = config.get("background_max_files_per_second", 0)
+background_max_read_per_second = config.get("background_max_read_per_second", 0)
+background_max_load = config.get("background_max_load", 0)
+background_max_latency_ms = config.get("background_max_latency_ms", 0)
+
+# Seconds after which a hung mkvmerge (probe) or mkvpropedit (edit) call is killed, 0 disables the timeout
+probe_timeout = config.get("probe_timeout", 120)
+edit_timeout = config.get("edit_timeout", 600)
+
+# Retries after a timeout, the delay before each retry doubles
+tool_retries = config.get("tool_retries", 2)
+tool_retry_delay = config.get("tool_retry_delay", 5)
+
+# Files that failed on the same device (mount) after which its remaining files are skipped, 0 never skips
+device_failure_limit = config.get("device_failure_limit", 3)
+
+# Reuse directory listings of directories whose mtime hasn't changed since the last scan, can be overwritten with --no_dir_index
+dir_index_cfg = config.get("dir_index", True)
+
+# Store the track information of probed files and reuse it while their size and mtime are unchanged, can be overwritten with --no_probe_cache
+probe_cache_cfg = config.get("probe_cache", True)
+
+# Keep the per-file scan results on disk instead of in memory, can be enabled with --low_memory
+low_memory_cfg = config.get("low_memory", False)
+
+# Directory for the directory index and other cached data
+cache_directory = config.get("cache_directory") or os.path.join(script_directory, "mkvp_cache")
+
 # Width of the horizontal separator bar
 h_bar = "─"*100
 
@@ -106,6 +182,24 @@ mkvs_renamed = 0
 # Global counter to see how many .mkv files were edited
 mkvs_edited = 0
 
+# State of --background throttling
+background = False
+throttle_next_file = 0
+throttle_next_read = 0
+throttle_last_read = 0
+
+# Failed files per device (st_dev), devices whose remaining files are skipped and skipped files with the reason
+device_failures = {}
+suspended_devices = set()
+skipped_files = []
+
+# Probe cache (sqlite3 connection), None if disabled
+probe_cache = None
+
+# Directory index, absolute directory path mapped to its mtime and entries from the last listing
+dir_index = {}
+use_dir_index = False
+
 ################################################## FUNCTIONS ##################################################
 
 def mkv_tools_on_path():
@@ -188,30 +282,46 @@ def print_track_info(track_info):
             print(h_bar)
 
 # Get the audio, subtitle and default-track info from the user
-def getInput(mkv_files, movies_in_cat, category_count, last_input):
+def getInput(mkv_files, movies_in_cat, category_count, last_input, file_aliases=None, titles=None):
     # Validate inputs and requery in case of mistakes
     pattern_input = re.compile(r'^(?: *(\w{2,5}) *| *(-) *),(?: +([\w\d]{2,5}) *| +(-) *)+,(?: +([\w\d]{2,5}) *| *(-) *)* *$') # Audio codes are mandatory, subtitle codes optional
+    file_aliases = file_aliases or {}
     testmovie = movies_in_cat[0]
     track_info = mkv_files[testmovie]
     group_filecount = len(movies_in_cat)
     video_track_count = len(mkv_files[testmovie]["video"]) if "video" in mkv_files[testmovie] else 0
     audio_track_count = len(mkv_files[testmovie]["audio"]) if "audio" in mkv_files[testmovie] else 0
     subtitle_track_count = len(mkv_files[testmovie]["subtitles"]) if "subtitles" in mkv_files[testmovie] else 0
+    mixed = mixed_tracks(mkv_files, movies_in_cat) if coarse_grouping else []
     while True:
         print()
         print(h_bar)
         print(os.path.basename(testmovie)[:100])
+        if titles and titles.get(testmovie): # The files aren't reachable when prompting from a snapshot, so show the title it was scanned with
+            print(f"Title: {titles[testmovie][:93]}")
         print(h_bar)
         print_track_info(track_info=track_info)
         print(h_bar)
+        if mixed:
+            print(f'Warning: {", ".join(mixed)} differ in name or flags between files, "-" keeps the values of each file.')
+            print(h_bar)
         print(f'Example: ja, de en1, def en1' if not last_input else f'Last input: {last_input}. Use "i" to reuse it')
         print(f'  "s" skip current group, "v" show possible codes, "f" show filenames in group, "ff" show filepaths')
+        print(f'  "l" list remaining groups, "j text" jump to groups matching text, "o size/path/scan" reorder groups, "q" quit')
         print(h_bar)
         user_input = input(f"Group {category_count + 1} contains {group_filecount} " + ("files." if group_filecount > 1 else "file.") + " \nCodes please:\n")
 
         # Skip the current group
         if user_input == "s":
             return user_input, last_input
+        # Jump, reorder or list typed without or with an unexpected argument
+        elif user_input.strip() in ("j", "o") or user_input.startswith("l "):
+            print('Usage: "j text" jump to groups matching text, "o size", "o path" or "o scan" reorder groups, "l" list remaining groups.')
+            sleep(1)
+            continue
+        # Quit, list, reorder or filter the queue of remaining groups
+        elif user_input in ("q", "l") or user_input.startswith(("j ", "o ")):
+            return user_input, last_input
         # Show all possible language codes
         elif user_input == "v":
             print(h_bar)
@@ -227,6 +337,8 @@ def getInput(mkv_files, movies_in_cat, category_count, last_input):
             print(f"{group_filecount} " + ("files" if group_filecount > 1 else "file") + " will be affected:")
             for file_path in movies_in_cat:
                 print(os.path.basename(file_path))
+                for alias in file_aliases.get(file_path, []): # Hardlinks/other mount paths of the same file, edited only once
+                    print(f"  alias: {os.path.basename(alias)}")
             print(h_bar)
             input("Press Enter to continue...")
             continue
@@ -236,6 +348,8 @@ def getInput(mkv_files, movies_in_cat, category_count, last_input):
             print(f"{group_filecount} " + ("files" if group_filecount > 1 else "file") + " will be affected:")
             for file_path in movies_in_cat:
                 print(os.path.abspath(file_path))
+                for alias in file_aliases.get(file_path, []):
+                    print(f"  alias: {os.path.abspath(alias)}")
             print(h_bar)
             input("Press Enter to continue...")
             continue
@@ -246,6 +360,8 @@ def getInput(mkv_files, movies_in_cat, category_count, last_input):
         inputs = []
         inputs.extend(user_input.split(",")[0].split())
         vcode_count = len(user_input.split(",")[0].split())
+        acode_count = 0
+        scode_count = 0
         try:
             inputs.extend(user_input.split(",")[1].split())
             acode_count = len(user_input.split(",")[1].split())
@@ -279,14 +395,230 @@ def getInput(mkv_files, movies_in_cat, category_count, last_input):
             print("Invalid language code(s), try again.")
             sleep(1)
 
-def fetch_json(file_path):
+def enter_background_mode():
+    # Lower the CPU and I/O priority of this process, mkvmerge and mkvpropedit inherit it
+    global throttle_next_file, throttle_next_read, throttle_last_read
+    if sys.platform == "win32":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.SetPriorityClass(kernel32.GetCurrentProcess(), subprocess.IDLE_PRIORITY_CLASS) # Inherited by child processes
+    else:
+        os.nice(19)
+        if shutil.which("ionice"): # Idle I/O class, only gets disk time when no other process needs it
+            subprocess.run(["ionice", "-c", "3", "-p", str(os.getpid())], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if background_max_read_per_second and read_bytes() is None:
+        print("Limiting the bytes read per second is only possible on Linux, ignoring background_max_read_per_second.")
+    throttle_next_file = throttle_next_read = monotonic()
+    throttle_last_read = read_bytes() or 0
+
+def read_bytes():
+    # Bytes read by this process and its finished child processes (mkvmerge/mkvpropedit), only available on Linux
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+def system_busy(file_path):
+    # Return why the system is too busy to continue or an empty string
+    if background_max_load:
+        try:
+            load = os.getloadavg()[0]
+            if load > background_max_load:
+                return f"load {load:.1f} > {background_max_load}"
+        except (AttributeError, OSError): # Not available on Windows
+            pass
+    if background_max_latency_ms:
+        start = perf_counter()
+        try:
+            os.stat(os.path.dirname(file_path) or ".")
+        except OSError: # Moved, deleted or stale folder, run_tool reports the file
+            return ""
+        latency_ms = (perf_counter() - start) * 1000
+        if latency_ms > background_max_latency_ms:
+            return f"latency {latency_ms:.0f}ms > {background_max_latency_ms}ms"
+    return ""
+
+def throttle(file_path):
+    # In background mode, wait until the next file may be processed without exceeding the configured limits
+    # Each file and each byte read pushes the next allowed start back, time spent idle (pauses, prompts, cached files) isn't saved up as credit
+    global throttle_next_file, throttle_next_read, throttle_last_read
+    if not background:
+        return
+    now = monotonic()
+    wait_until = now
+    if background_max_files_per_second:
+        wait_until = max(wait_until, throttle_next_file)
+        throttle_next_file = max(now, throttle_next_file) + 1 / background_max_files_per_second
+    if background_max_read_per_second:
+        current_read = read_bytes()
+        if current_read is not None:
+            # Charge the bytes read since the previous call, mostly by the previous mkvmerge/mkvpropedit
+            throttle_next_read = max(now, throttle_next_read) + (current_read - throttle_last_read) / background_max_read_per_second
+            throttle_last_read = current_read
+            wait_until = max(wait_until, throttle_next_read)
+    if wait_until > now:
+        sleep(wait_until - now)
+    busy = system_busy(file_path)
+    if busy:
+        tqdm.write(f"Pausing, {busy}.")
+        while busy:
+            sleep(10)
+            busy = system_busy(file_path)
+        tqdm.write("Resuming.")
+        # Start counting again after the pause
+        throttle_next_file = monotonic() + (1 / background_max_files_per_second if background_max_files_per_second else 0)
+        throttle_next_read = monotonic()
+        throttle_last_read = read_bytes() or 0
+
+def run_tool(command, timeout, file_path, device):
+    # Run mkvmerge/mkvpropedit and return its output or None if it failed
+    # Hung calls (stale SMB/NFS handles) are killed and retried, after device_failure_limit failed files the device is suspended
+    if device is not None and device in suspended_devices:
+        skipped_files.append((file_path, "device suspended"))
+        return None
+    delay = tool_retry_delay
+    for attempt in range(tool_retries + 1):
+        throttle(file_path)
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT if command[0] == "mkvpropedit" else None)
+        try:
+            output, _ = process.communicate(timeout=timeout or None)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            try:
+                process.communicate(timeout=5)
+            except subprocess.TimeoutExpired: # Stuck in uninterruptible I/O, leave it behind
+                pass
+            if attempt < tool_retries:
+                tqdm.write(f"{command[0]} timed out after {timeout}s on {file_path}, retrying in {delay}s.")
+                sleep(delay)
+                delay *= 2
+            continue
+        if process.returncode > 1: # 1 only means warnings
+            tqdm.write(f"Error while using {command[0]} on {file_path}, exit code {process.returncode}.")
+            skipped_files.append((file_path, f"{command[0]} error"))
+            return None
+        return output
+    tqdm.write(f"{command[0]} timed out {tool_retries + 1} times on {file_path}, skipping it.")
+    skipped_files.append((file_path, f"{command[0]} timed out"))
+    if device is not None:
+        device_failures[device] = device_failures.get(device, 0) + 1
+        if device_failure_limit and device_failures[device] >= device_failure_limit:
+            suspended_devices.add(device)
+            tqdm.write(f"{device_failures[device]} files timed out on the device of {file_path}, skipping all remaining files on it.")
+    return None
+
+def print_skipped_files():
+    if not skipped_files:
+        return
+    print(h_bar)
+    print(f"Skipped {len(skipped_files)} " + ("files:" if len(skipped_files) > 1 else "file:"))
+    for file_path, reason in skipped_files:
+        print(f"{reason:24} | {file_path}")
+    if suspended_devices:
+        print(f"{len(suspended_devices)} " + ("devices were" if len(suspended_devices) > 1 else "device was") + " suspended after repeated timeouts, check the mounts and re-run the script.")
+    print(h_bar)
+
+def fetch_json(file_path, device=None):
     # Get all mkv info as JSON
     mkvmerge_command = ["mkvmerge", "-J", file_path]
+    output = run_tool(mkvmerge_command, probe_timeout, file_path, device)
+    if output is None:
+        return None
     try:
-        mkvmerge_json = json.loads((subprocess.check_output(mkvmerge_command)))
-    except subprocess.CalledProcessError:
+        return json.loads(output)
+    except ValueError:
         print(f"Error while extracting track information for {file_path}")
-    return mkvmerge_json
+        skipped_files.append((file_path, "invalid mkvmerge output"))
+        return None
+
+# Matroska element IDs needed to find the Tracks element
+EBML_HEADER = 0x1A45DFA3
+EBML_SEGMENT = 0x18538067
+EBML_CLUSTER = 0x1F43B675
+EBML_TRACKS = 0x1654AE6B
+EBML_TRACK_ENTRY = 0xAE
+EBML_TRACK_UID = 0x73C5
+EBML_VOID = 0xEC
+
+def read_vint(stream, keep_marker=False):
+    # Read an EBML variable length integer, element IDs keep their length marker, sizes don't
+    first = stream.read(1)
+    if not first:
+        raise EOFError
+    length = 1
+    mask = 0x80
+    while not first[0] & mask:
+        mask >>= 1
+        length += 1
+        if length > 8:
+            raise ValueError("Invalid EBML variable length integer")
+    rest = stream.read(length - 1)
+    if len(rest) != length - 1:
+        raise EOFError
+    value = first[0] if keep_marker else first[0] & (mask - 1)
+    for byte in rest:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        return None # Unknown size
+    return value
+
+def tracks_fingerprint(file_path):
+    # Hash the Tracks element of a .mkv file with a few small reads, returns None if it can't be found before the first Cluster
+    # TrackUIDs are random per remux, so they are left out to give files with identical tracks the same fingerprint
+    try:
+        with open(file_path, "rb") as f:
+            if read_vint(f, keep_marker=True) != EBML_HEADER:
+                return None
+            header_size = read_vint(f)
+            if header_size is None: # Unknown size, corrupt or truncated file
+                return None
+            f.seek(header_size, 1)
+            if read_vint(f, keep_marker=True) != EBML_SEGMENT:
+                return None
+            read_vint(f) # Segment size, often unknown
+            for _ in range(32): # SeekHead, Info, Void etc. come before the Tracks element
+                element_id = read_vint(f, keep_marker=True)
+                size = read_vint(f)
+                if element_id == EBML_CLUSTER or size is None:
+                    return None
+                if element_id != EBML_TRACKS:
+                    f.seek(size, 1)
+                    continue
+                if size > 1024 * 1024:
+                    return None
+                tracks = f.read(size)
+                if len(tracks) != size:
+                    return None
+                break
+            else:
+                return None
+        fingerprint = hashlib.sha1()
+        tracks = io.BytesIO(tracks)
+        while tracks.tell() < size:
+            element_id = read_vint(tracks, keep_marker=True)
+            entry_size = read_vint(tracks)
+            if entry_size is None:
+                return None
+            entry = tracks.read(entry_size)
+            if element_id != EBML_TRACK_ENTRY:
+                continue
+            fingerprint.update(b"track")
+            entry = io.BytesIO(entry)
+            while entry.tell() < entry_size:
+                start = entry.tell()
+                child_id = read_vint(entry, keep_marker=True)
+                child_size = read_vint(entry)
+                if child_size is None:
+                    return None
+                entry.seek(child_size, 1)
+                if child_id not in (EBML_TRACK_UID, EBML_VOID):
+                    fingerprint.update(entry.getbuffer()[start:entry.tell()])
+        return fingerprint.hexdigest()
+    except (OSError, EOFError, ValueError):
+        return None
 
 def track_exists(track, prop, alternative=None, fallback=False):
     # Check if the desired json element exists and return an alternative or a fallback if not
@@ -365,8 +697,24 @@ def get_track_info(mkvmerge_json):
             print("Parsing json failed.")
     return track_info
 
+def mixed_tracks(mkv_files, movies_in_cat):
+    # Find tracks whose names or flags differ between the files of a group, "-" keeps these per file
+    fields = {"audio": ["name", "default", "comm"], "subtitles": ["name", "forced", "default", "sdh", "comm"]}
+    values = {} # (track prefix, index) mapped to the distinct names/flags of that track
+    for file_path in movies_in_cat: # Read each file's track information only once
+        track_info = mkv_files[file_path]
+        for tracktype, prefix in (("audio", "a"), ("subtitles", "s")):
+            for index, track in enumerate(track_info.get(tracktype, [])):
+                values.setdefault((prefix, index), set()).add(tuple(track[field] for field in fields[tracktype]))
+    return [f"{prefix}{index + 1}" for (prefix, index), track_values in values.items() if len(track_values) > 1]
+
 def create_cat(track_info): # Create distinctive categories based on track information
     cat = ""
+    if coarse_grouping:
+        # Only the track layout that the input has to match, names and flags are left to the user input
+        for tracktype, tracks in track_info.items():
+            cat += f"{tracktype}{len(tracks)}:" + "".join(f"{track["codec"]}|{track["lang"]}|" for track in tracks)
+        return tuple((cat,))
     for tracktype, tracks in track_info.items():
         if tracktype == "video":
             for track in tracks:
@@ -379,91 +727,384 @@ def create_cat(track_info): # Create distinctive categories based on track infor
                 cat += f"{track["id"]}{track["lang"]}{track["name"]}{track["codec"]}{track["forced"]}{track["default"]}{track["sdh"]}{track["comm"]}"
     return tuple((cat,))
 
-# Fetch video, audio and subtitle information for mkv files and optionally sort them into categories
-def process_video_files(directory, single_folder, create_categories=True):
-    category_dict = {}
-    mkv_files = {}
-    if not single_folder:
-        with tqdm(desc="Sorting mkvs into categories", unit=" files", ncols=100) as pbar:
-            mkv_count = 0
-            pbar.set_postfix({"mkv files": mkv_count})
-            for filename in os.listdir(directory): # scan the root/base directory for .mkv files
+def load_dir_index():
+    global dir_index
+    index_path = os.path.join(cache_directory, "dir_index.json")
+    if not os.path.isfile(index_path):
+        return
+    try:
+        with open(index_path, "r", encoding="utf8") as f:
+            index = json.load(f)
+        if index.get("version") == 1:
+            dir_index = index["dirs"]
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error while reading the directory index {index_path}: {e}\nListing all directories instead.")
+
+def save_dir_index():
+    index_path = os.path.join(cache_directory, "dir_index.json")
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        with open(index_path + ".tmp", "w", encoding="utf8") as f:
+            json.dump({"version": 1, "dirs": dir_index}, f)
+        os.replace(index_path + ".tmp", index_path) # Replace the old index only once the new one is complete
+    except OSError as e:
+        print(f"Error while saving the directory index {index_path}: {e}")
+
+def list_dir(path):
+    # Return the file names, subdirectory names and symlinked subdirectory names of a directory,
+    # taken from the directory index if the directory's mtime hasn't changed since it was last listed
+    key = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    entry = dir_index.get(key) if use_dir_index else None
+    if entry and entry["mtime"] == mtime and not entry["racy"]:
+        return entry["files"], entry["dirs"], entry["links"]
+    listed = time_ns()
+    files = []
+    dirs = []
+    links = []
+    with os.scandir(path) as it:
+        for dir_entry in it:
+            if not dir_entry.is_dir():
+                files.append(dir_entry.name)
+            elif dir_entry.is_symlink():
+                links.append(dir_entry.name)
+            else:
+                dirs.append(dir_entry.name)
+    if use_dir_index:
+        # A change within the same mtime tick as the listing would go unnoticed, so recently changed directories are listed again next time
+        racy = listed - mtime < 2_000_000_000
+        dir_index[key] = {"mtime": mtime, "racy": racy, "files": files, "dirs": dirs, "links": links}
+    return files, dirs, links
+
+def walk_dirs(directory, single_folder):
+    # Yield the path and file names of the base directory and (unless single_folder) of all subdirectories that aren't ignored
+    # Like os.walk, symlinked subdirectories are scanned but not recursed into
+    stack = [(directory, True)]
+    while stack:
+        path, recurse = stack.pop()
+        files, dirs, links = list_dir(path)
+        yield path, files
+        if single_folder or not recurse:
+            continue
+        subdirs = [(os.path.join(path, d), True) for d in dirs if d.lower() not in ignore_dirs] # ignore folders containing extras etc.
+        subdirs += [(os.path.join(path, d), False) for d in links if d.lower() not in ignore_dirs]
+        stack.extend(reversed(subdirs))
+
+def rename_files(renames, undo_log=None):
+    # Rename files as a batch, directory by directory, and return the renames that were done
+    # The directory index and the probe cache are updated so the tool's own renames don't mark anything as changed
+    done = []
+    by_dir = {}
+    for old_path, new_path in renames:
+        by_dir.setdefault(os.path.dirname(old_path), []).append((old_path, new_path))
+    with tqdm(total=len(renames), desc="Renaming", unit=" files", ncols=100) as pbar:
+        for dir_path, dir_renames in by_dir.items():
+            dir_key = os.path.abspath(dir_path)
+            entry = dir_index.get(dir_key) if use_dir_index else None
+            mtime_before = os.stat(dir_path or ".").st_mtime_ns if entry else None
+            dir_done = []
+            for old_path, new_path in dir_renames:
+                pbar.update(1)
+                try:
+                    os.rename(old_path, new_path)
+                except OSError as e:
+                    tqdm.write(f"Error while renaming {old_path}: {e}")
+                    continue
+                dir_done.append((old_path, new_path))
+                if undo_log:
+                    undo_log.write(json.dumps({"old": os.path.abspath(old_path), "new": os.path.abspath(new_path)}) + "\n")
+                    undo_log.flush() # Keep the log complete even if the run is interrupted
+            done.extend(dir_done)
+            if probe_cache is not None: # Renaming keeps size and mtime, so the probe results stay valid
+                probe_cache.executemany("UPDATE OR REPLACE probes SET path = ? WHERE path = ?",
+                                        [(os.path.abspath(new_path), os.path.abspath(old_path)) for old_path, new_path in dir_done])
+                probe_cache.commit()
+            if not entry:
+                continue
+            if entry["mtime"] == mtime_before:
+                renamed = {os.path.basename(old_path): os.path.basename(new_path) for old_path, new_path in dir_done}
+                entry["files"] = [renamed.get(filename, filename) for filename in entry["files"]]
+                entry["mtime"] = os.stat(dir_path or ".").st_mtime_ns
+                entry["racy"] = True # Another change within the same mtime tick would go unnoticed
+            else:
+                del dir_index[dir_key] # Changed by something else as well, list it again
+    return done
+
+def file_key(file_path, stat):
+    # Identify the physical file behind a path so hardlinks and bind mounts are only probed and edited once
+    if stat is None or stat.st_ino == 0: # Some network filesystems on Windows don't report inode numbers
+        return file_path
+    return (stat.st_dev, stat.st_ino)
+
+def open_probe_cache():
+    global probe_cache
+    cache_path = os.path.join(cache_directory, "probe_cache.sqlite")
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        probe_cache = sqlite3.connect(cache_path)
+        probe_cache.execute("CREATE TABLE IF NOT EXISTS probes (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, track_info TEXT)")
+    except (OSError, sqlite3.Error) as e:
+        print(f"Error while opening the probe cache {cache_path}: {e}\nProbing all files instead.")
+        probe_cache = None
+
+def cached_track_info(file_path, stat):
+    # Return the stored track information if the file's size and mtime haven't changed since it was probed
+    if probe_cache is None or stat is None:
+        return None
+    row = probe_cache.execute("SELECT size, mtime, track_info FROM probes WHERE path = ?", (os.path.abspath(file_path),)).fetchone()
+    if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+        return json.loads(row[2])
+    return None
+
+def store_track_info(file_path, stat, track_info):
+    if probe_cache is None or stat is None:
+        return
+    probe_cache.execute("INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)", (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns, json.dumps(track_info)))
+
+def scan_mkv_files(directory, single_folder, seen_files=None, fingerprints=None):
+    # Yield (file_path, track_info, None, device) for every .mkv file and (file_path, None, first_path, device) for further paths of an already found file
+    # device is the st_dev of the file or None if it is unknown, so files on suspended devices can be skipped later without another stat
+    # Files are only held while they are yielded, so callers decide what to keep in memory
+    fingerprints = {} if fingerprints is None else fingerprints # Tracks element fingerprints mapped to the track information of the first file with that fingerprint
+    seen_files = {} if seen_files is None else seen_files # (st_dev, st_ino) mapped to the first successfully probed path of that file
+    mkv_count = 0
+    alias_count = 0
+    reused_count = 0
+    with tqdm(desc="Sorting mkvs into categories" if not single_folder else "searching", unit=" files", ncols=100) as pbar:
+        pbar.set_postfix({"mkv files": mkv_count, "aliases": alias_count, "reused": reused_count})
+        for dir_path, filenames in walk_dirs(directory, single_folder):
+            for filename in filenames:
                 pbar.update(1)
                 match_unwanted = re.match(pattern_unwanted, filename) # Ignore trailers, samples
-                if filename.endswith(".mkv") and not match_unwanted:
-                    mkv_count += 1
-                    pbar.set_postfix({"mkv files": mkv_count})
-                    file_path = os.path.join(directory, filename)
-                    # Get detailed mkv information as JSON
-                    mkvmerge_json = fetch_json(file_path)
-                    # Collect only the info needed for sorting and selecting
-                    track_info = get_track_info(mkvmerge_json)
-                    # Store track info for later use
-                    mkv_files[file_path] = track_info
-                    if create_categories:
-                        # Create a unique category based on track information
-                        cat = create_cat(track_info)
-                        # Sort file paths into groups
-                        if cat in category_dict:
-                            category_dict[cat].append(file_path)
-                        else:
-                            category_dict[cat] = [file_path]
-            for root, dirs, files in os.walk(directory): # scan subfolders recursively
-                dirs[:] = [d for d in dirs if d.lower() not in ignore_dirs] # ignore folders containing extras etc.
-                for dir in dirs:
-                    for filename in os.listdir(os.path.join(root, dir)):
-                        pbar.update(1)
-                        match_unwanted = re.match(pattern_unwanted, filename)
-                        if filename.endswith(".mkv") and not match_unwanted:
-                            mkv_count += 1
-                            pbar.set_postfix({"mkv files": mkv_count})
-                            file_path = os.path.join(root, dir, filename)
-                            # Get detailed mkv information as JSON
-                            mkvmerge_json = fetch_json(file_path)
-                            # Collect only the info needed for sorting and selecting
-                            track_info = get_track_info(mkvmerge_json)
-                            # Store track info for later use
-                            mkv_files[file_path] = track_info
-                            if create_categories:
-                                # Create a unique category based on track information
-                                cat = create_cat(track_info)
-                                # Sort file paths into groups
-                                if cat in category_dict:
-                                    category_dict[cat].append(file_path)
-                                else:
-                                    category_dict[cat] = [file_path]
+                if not filename.endswith(".mkv") or match_unwanted:
+                    continue
+                file_path = os.path.join(dir_path, filename)
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    stat = None
+                key = file_key(file_path, stat)
+                device = key[0] if isinstance(key, tuple) else None
+                if key in seen_files:
+                    # Same inode under another path, only list it as an alias of the first path
+                    alias_count += 1
+                    pbar.set_postfix({"mkv files": mkv_count, "aliases": alias_count, "reused": reused_count})
+                    yield file_path, None, seen_files[key], device
+                    continue
+                mkv_count += 1
+                if device is not None and device in suspended_devices:
+                    skipped_files.append((file_path, "device suspended"))
+                    continue
+                track_info = cached_track_info(file_path, stat)
+                if track_info is not None:
+                    reused_count += 1
+                else:
+                    fingerprint = tracks_fingerprint(file_path) if fingerprint_tracks else None
+                    if fingerprint in fingerprints:
+                        # Identical track headers, the track information is only read and never modified so it can be shared
+                        track_info = fingerprints[fingerprint]
+                        reused_count += 1
+                    else:
+                        # Get detailed mkv information as JSON
+                        mkvmerge_json = fetch_json(file_path, device)
+                        if mkvmerge_json is None:
+                            continue
+                        # Collect only the info needed for sorting and selecting
+                        track_info = get_track_info(mkvmerge_json)
+                        if fingerprint:
+                            fingerprints[fingerprint] = track_info
+                    store_track_info(file_path, stat, track_info)
+                # Only registered now, so if probing failed the next path of the file is probed instead of becoming an alias of a skipped file
+                seen_files[key] = file_path
+                pbar.set_postfix({"mkv files": mkv_count, "aliases": alias_count, "reused": reused_count})
+                yield file_path, track_info, None, device
+    if probe_cache is not None:
+        probe_cache.commit()
+
+class SpillStore:
+    # Private temporary SQLite database (deleted when closed) holding the per-file scan results of a --low_memory scan
+    def __init__(self):
+        self.db = sqlite3.connect("")
+        self.db.execute("PRAGMA journal_mode=OFF")
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute("PRAGMA cache_size=-32768") # At most 32MB of pages in memory
+        self.db.execute("CREATE TABLE entries (store TEXT, key TEXT, value TEXT, PRIMARY KEY (store, key))")
+        self.db.execute("CREATE TABLE files (id INTEGER PRIMARY KEY, cat INTEGER, path TEXT)")
+        self.db.execute("CREATE INDEX files_cat ON files (cat, id)")
+
+class SpilledDict:
+    # Dict-like view of one store in a SpillStore, keys and values are stored as JSON
+    def __init__(self, spill_store, name):
+        self.db = spill_store.db
+        self.name = name
+
+    def __contains__(self, key):
+        return self.db.execute("SELECT 1 FROM entries WHERE store = ? AND key = ?", (self.name, json.dumps(key))).fetchone() is not None
+
+    def __getitem__(self, key):
+        row = self.db.execute("SELECT value FROM entries WHERE store = ? AND key = ?", (self.name, json.dumps(key))).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (self.name, json.dumps(key), json.dumps(value)))
+
+    def __delitem__(self, key):
+        self.db.execute("DELETE FROM entries WHERE store = ? AND key = ?", (self.name, json.dumps(key)))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM entries WHERE store = ?", (self.name,)).fetchone()[0]
+
+    def items(self):
+        for key, value in self.db.execute("SELECT key, value FROM entries WHERE store = ?", (self.name,)):
+            yield json.loads(key), json.loads(value)
+
+    def __iter__(self):
+        for key, value in self.items():
+            yield key
+
+class SpilledPaths:
+    # Read-only sequence of the paths of one category, streamed from a SpillStore
+    def __init__(self, spill_store, cat_id, count):
+        self.db = spill_store.db
+        self.cat_id = cat_id
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.db.execute("SELECT path FROM files WHERE cat = ? ORDER BY id LIMIT 1 OFFSET ?", (self.cat_id, index)).fetchone()[0]
+
+    def __iter__(self):
+        for (file_path,) in self.db.execute("SELECT path FROM files WHERE cat = ? ORDER BY id", (self.cat_id,)):
+            yield file_path
+
+class SpilledCategories:
+    # Dict-like mapping of categories to their paths, only the categories and their file counts stay in memory
+    def __init__(self, spill_store):
+        self.spill_store = spill_store
+        self.cat_ids = {}
+        self.counts = {}
+
+    def add(self, cat, file_path):
+        cat_id = self.cat_ids.setdefault(cat, len(self.cat_ids))
+        self.counts[cat] = self.counts.get(cat, 0) + 1
+        self.spill_store.db.execute("INSERT INTO files (cat, path) VALUES (?, ?)", (cat_id, file_path))
+
+    def replace(self, cat, old_path, new_path):
+        self.spill_store.db.execute("UPDATE files SET path = ? WHERE cat = ? AND path = ?", (new_path, self.cat_ids[cat], old_path))
+
+    def __contains__(self, cat):
+        return cat in self.counts
+
+    def __getitem__(self, cat):
+        return SpilledPaths(self.spill_store, self.cat_ids[cat], self.counts[cat])
+
+    def get(self, cat, default=None):
+        return self[cat] if cat in self.counts else default
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __iter__(self):
+        return iter(self.counts)
+
+    def keys(self):
+        return self.counts.keys()
+
+    def items(self):
+        for cat in self.counts:
+            yield cat, self[cat]
+
+def has_nfo(file_path):
+    return os.path.isfile(os.path.splitext(file_path)[0] + ".nfo")
+
+def prefer_nfo_paths(category_dict, mkv_files, file_aliases, file_devices):
+    # The first path found for a hardlinked file is often a copy outside the library (downloads) without an .nfo
+    # Make an alias with a matching .nfo the edited path instead, so the title is taken from the .nfo
+    swaps = []
+    for file_path, aliases in file_aliases.items():
+        if has_nfo(file_path):
+            continue
+        nfo_alias = next((alias for alias in aliases if has_nfo(alias)), None)
+        if nfo_alias:
+            swaps.append((file_path, nfo_alias, aliases))
+    for old_path, new_path, aliases in swaps:
+        track_info = mkv_files[old_path]
+        del mkv_files[old_path]
+        mkv_files[new_path] = track_info
+        file_devices[new_path] = file_devices[old_path]
+        del file_devices[old_path]
+        del file_aliases[old_path]
+        file_aliases[new_path] = [old_path] + [alias for alias in aliases if alias != new_path]
+        if category_dict is None:
+            continue
+        cat = create_cat(track_info)
+        if isinstance(category_dict, SpilledCategories):
+            category_dict.replace(cat, old_path, new_path)
+        else:
+            paths = category_dict[cat]
+            paths[paths.index(old_path)] = new_path
+
+# Fetch video, audio and subtitle information for mkv files and optionally sort them into categories
+def process_video_files(directory, single_folder, create_categories=True, low_memory=False):
+    if low_memory:
+        # Per-file data goes to disk as it is produced, only the categories and their counts stay in memory
+        spill_store = SpillStore()
+        category_dict = SpilledCategories(spill_store)
+        mkv_files = SpilledDict(spill_store, "mkv_files")
+        file_aliases = SpilledDict(spill_store, "aliases")
+        seen_files = SpilledDict(spill_store, "seen_files")
+        fingerprints = SpilledDict(spill_store, "fingerprints")
+        file_devices = SpilledDict(spill_store, "file_devices")
     else:
-        with tqdm(desc="searching", unit=" files", ncols=100) as pbar:
-            mkv_count = 0
-            pbar.set_postfix({"mkv files": mkv_count})
-            for filename in os.listdir(directory):
-                pbar.update(1)
-                match_unwanted = re.match(pattern_unwanted, filename)
-                if filename.endswith(".mkv") and not match_unwanted:
-                    mkv_count += 1
-                    pbar.set_postfix({"mkv files": mkv_count})
-                    file_path = os.path.join(directory, filename)
-                    # Get detailed mkv information as JSON
-                    mkvmerge_json = fetch_json(file_path)
-                    # Collect only the info needed for sorting and selecting
-                    track_info = get_track_info(mkvmerge_json)
-                    # Store track info for later use
-                    mkv_files[file_path] = track_info
-                    if create_categories:
-                        # Create a unique category based on track information
-                        cat = create_cat(track_info)
-                        # Sort file paths into groups
-                        if cat in category_dict:
-                            category_dict[cat].append(file_path)
-                        else:
-                            category_dict[cat] = [file_path]
-    if create_categories and category_dict == {}:
-        print(f"Found no .mkv files in {directory}, exiting.")
+        category_dict = {}
+        mkv_files = {}
+        file_aliases = {} # Paths of already probed files mapped to the other paths under which they were found
+        seen_files = {}
+        fingerprints = {}
+        file_devices = {} # Paths mapped to the device they were found on
+    for file_path, track_info, alias_of, device in scan_mkv_files(directory, single_folder, seen_files, fingerprints):
+        if alias_of:
+            aliases = file_aliases.get(alias_of, [])
+            aliases.append(file_path)
+            file_aliases[alias_of] = aliases
+            continue
+        # Store track info for later use
+        mkv_files[file_path] = track_info
+        file_devices[file_path] = device
+        if create_categories:
+            # Create a unique category based on track information
+            cat = create_cat(track_info)
+            # Sort file paths into groups
+            if low_memory:
+                category_dict.add(cat, file_path)
+            elif cat in category_dict:
+                category_dict[cat].append(file_path)
+            else:
+                category_dict[cat] = [file_path]
+    prefer_nfo_paths(category_dict if create_categories else None, mkv_files, file_aliases, file_devices)
+    if create_categories and len(category_dict) == 0:
+        if skipped_files: # Every file failed or timed out, e.g. on a stale mount
+            print_skipped_files()
+            print(f"All .mkv files in {directory} were skipped, exiting.")
+        else:
+            print(f"Found no .mkv files in {directory}, exiting.")
         sys.exit(1)
     elif not create_categories:
         return mkv_files
     else:        
-        return category_dict, mkv_files
+        return category_dict, mkv_files, file_aliases, file_devices
 
 def append_sub_format(track_info):
     subnames = []
@@ -473,149 +1114,107 @@ def append_sub_format(track_info):
         subformats.append(track["codec"])
     return subformats, subnames
 
-def strip_counter(directory, single_folder):
-    global mkvs_renamed
+def plan_renames(directory, single_folder, strip_counters=True, match_nfos=True):
+    # Plan all renames from one walk over the directory index, collisions are detected in memory instead of checking each target on disk
+    # Returns the planned (old path, new path) renames and the skipped (old path, new path) renames whose target already exists
     pattern_appended_num = re.compile(r'^(.*?)(?:\s\(\d\))+\.mkv$') # match remuxed files that had (1), (2) etc. appended
-    skipped_mkvs = []
-    if not single_folder:
-        with tqdm(desc="Stripping appended counters", unit=" files", ncols=100) as pbar:
-            stripped_count = 0
-            skipped_count = 0
-            pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-            for filename in os.listdir(directory): # scan the root/base directory for .mkv files
-                    pbar.update(1)
+    plan = []
+    skipped = []
+    with tqdm(desc="Planning renames", unit=" files", ncols=100) as pbar:
+        pbar.set_postfix({"renames": len(plan), "skipped": len(skipped)})
+        for dir_path, filenames in walk_dirs(directory, single_folder):
+            pbar.update(len(filenames))
+            listed_names = set(filenames)
+            names = set(filenames) # names after the planned renames
+            folded_names = {} # case folded names mapped to the names after the planned renames, for the collision check
+            for filename in filenames:
+                folded_names.setdefault(filename.casefold(), set()).add(filename)
+            sources = {} # new name mapped to the original name, so chained renames become a single rename
+
+            def plan_rename(name, new_name):
+                taken = folded_names.get(new_name.casefold(), set()) - {name}
+                # SMB/NTFS are case insensitive, so a name that only differs in case is taken there but not on a case sensitive filesystem
+                # Only that rare case is checked on disk, names that only exist in the plan count as taken
+                if new_name in taken or (taken and (not taken <= listed_names or os.path.exists(os.path.join(dir_path, new_name)))):
+                    skipped.append((os.path.join(dir_path, sources.get(name, name)), os.path.join(dir_path, new_name)))
+                    return
+                names.discard(name)
+                names.add(new_name)
+                folded_names[name.casefold()].discard(name)
+                folded_names.setdefault(new_name.casefold(), set()).add(new_name)
+                sources[new_name] = sources.pop(name, name)
+
+            # Strip " (1)" etc. appended by remuxing
+            if strip_counters:
+                for filename in sorted(filenames):
                     match_appended_num = re.match(pattern_appended_num, filename) # gets the filename without (1), (2) etc.
                     if match_appended_num:
-                        trimmed_name = os.path.join(directory, match_appended_num.group(1)+".mkv")
-                        if os.path.isfile(trimmed_name): # check if the file without the number exists
-                            skipped_mkvs.append(trimmed_name)
-                            skipped_count += 1
-                            pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-                        else:
-                            os.rename(os.path.join(directory, filename), trimmed_name)
-                            mkvs_renamed += 1
-                            stripped_count += 1
-                            pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-            for root, dirs, files in os.walk(directory):
-                dirs[:] = [d for d in dirs if d.lower() not in ignore_dirs] # ignore folders containing extras etc.
-                for dir in dirs:
-                    for filename in os.listdir(os.path.join(root, dir)):
-                        pbar.update(1)
-                        match_appended_num = re.match(pattern_appended_num, filename) # gets the filename without (1), (2) etc.
-                        if match_appended_num:
-                            trimmed_name = os.path.join(root, dir, match_appended_num.group(1)+".mkv")
-                            if os.path.isfile(trimmed_name): # check if the file without the number exists
-                                skipped_mkvs.append(trimmed_name)
-                                skipped_count += 1
-                                pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-                            else:
-                                os.rename(os.path.join(root, dir, filename), trimmed_name)
-                                mkvs_renamed += 1
-                                stripped_count += 1
-                                pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-    else:
-        with tqdm(desc="Stripping appended counters", unit=" files", ncols=100) as pbar:
-            stripped_count = 0
-            skipped_count = 0
-            pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-            for filename in os.listdir(directory):
-                pbar.update(1)
-                match_appended_num = re.match(pattern_appended_num, filename) # gets the filename without (1), (2) etc.
-                if match_appended_num:
-                    trimmed_name = os.path.join(directory, match_appended_num.group(1)+".mkv")
-                    if os.path.isfile(trimmed_name): # check if the file without the number exists
-                        skipped_mkvs.append(trimmed_name)
-                        skipped_count += 1
-                        pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-                    else:
-                        os.rename(os.path.join(directory, filename), trimmed_name)
-                        mkvs_renamed += 1
-                        stripped_count += 1
-                        pbar.set_postfix({"renamed": stripped_count, "skipped": skipped_count})
-    if skipped_mkvs:
-        print("Skipped renaming of:")
-        for path in skipped_mkvs:
-            print(path)            
-
-def rename_to_nfo(directory, single_folder):
+                        plan_rename(filename, match_appended_num.group(1) + ".mkv")
+            # Rename the .mkv to match the .nfo if there is exactly one of each
+            if match_nfos:
+                mkvs = [name for name in names if name.endswith(".mkv") and not re.match(pattern_unwanted, name)]
+                nfos = [name[:-4] for name in names if name.endswith(".nfo") and not name in ignore_nfos]
+                if len(mkvs) == 1 and len(nfos) == 1 and mkvs[0] != nfos[0] + ".mkv":
+                    plan_rename(mkvs[0], nfos[0] + ".mkv")
+            for new_name, old_name in sources.items():
+                if old_name != new_name:
+                    plan.append((os.path.join(dir_path, old_name), os.path.join(dir_path, new_name)))
+            pbar.set_postfix({"renames": len(plan), "skipped": len(skipped)})
+    return plan, skipped
+
+def rename_mkv_files(directory, single_folder, dry_run=False):
     global mkvs_renamed
-    if not single_folder:
-        with tqdm(desc="Renaming .mkv to match .nfo", unit=" files", ncols=100) as pbar:
-            mkv_to_nfo_count = 0
-            pbar.set_postfix({"renamed": mkv_to_nfo_count})
-            mkv_count = 0
-            nfo_count = 0
-            mkvs = []
-            nfos = []
-            for filename in os.listdir(directory):
-                pbar.update(1)
-                match = re.match(pattern_unwanted, filename)
-                if filename.endswith(".mkv") and not match:
-                    mkv_count += 1
-                    mkvs.append(filename)
-                    if mkv_count > 1:
-                        break
-                if filename.endswith(".nfo") and not filename in ignore_nfos:
-                    nfo_count +=1
-                    nfos.append(filename[:-4])
-                    if nfo_count > 1:
-                        break
-            if mkv_count == 1 and nfo_count == 1 and mkvs[0] != nfos[0] + ".mkv":
-                os.rename(mkvs[0], nfos[0] + ".mkv")
-                mkv_to_nfo_count += 1
-                pbar.set_postfix({"renamed": mkv_to_nfo_count})
-                mkvs_renamed += 1
-            for root, dirs, files in os.walk(directory):
-                dirs[:] = [d for d in dirs if d.lower() not in ignore_dirs] # ignore folders containing extras etc.
-                for dir in dirs:
-                    mkv_count = 0
-                    nfo_count = 0
-                    mkvs = []
-                    nfos = []
-                    for filename in os.listdir(os.path.join(root, dir)):
-                        pbar.update(1)
-                        match_unwanted = re.match(pattern_unwanted, filename) # match unwanted files
-                        if filename.endswith(".mkv") and not match_unwanted:
-                            mkv_count += 1
-                            mkvs.append(os.path.join(root, dir, filename))
-                            if mkv_count > 1:
-                                break
-                        if filename.endswith(".nfo") and not filename in ignore_nfos:
-                            nfo_count +=1
-                            nfos.append(os.path.join(root, dir, filename)[:-4])
-                            if nfo_count > 1:
-                                break
-                    if mkv_count == 1 and nfo_count == 1 and mkvs[0] != nfos[0] + ".mkv":
-                        os.rename(mkvs[0], nfos[0] + ".mkv")
-                        mkv_to_nfo_count += 1
-                        pbar.set_postfix({"renamed": mkv_to_nfo_count})
-                        mkvs_renamed += 1
-    else:
-        with tqdm(desc="Renaming .mkv files to match .nfo files", unit=" mkvs", ncols=100) as pbar:
-            mkv_to_nfo_count = 0
-            pbar.set_postfix({"renamed": mkv_to_nfo_count})
-            mkv_count = 0
-            nfo_count = 0
-            mkvs = []
-            nfos = []
-            for filename in os.listdir(directory):
-                pbar.update(1)
-                match = re.match(pattern_unwanted, filename)
-                if filename.endswith(".mkv") and not match:
-                    mkv_count += 1
-                    mkvs.append(filename)
-                    if mkv_count > 1:
-                        break
-                if filename.endswith(".nfo") and not filename in ignore_nfos:
-                    nfo_count +=1
-                    nfos.append(filename[:-4])
-                    if nfo_count > 1:
-                        break
-            if mkv_count == 1 and nfo_count == 1 and mkvs[0] != nfos[0] + ".mkv":
-                os.rename(mkvs[0], nfos[0] + ".mkv")
-                mkv_to_nfo_count += 1
-                pbar.set_postfix({"renamed": mkv_to_nfo_count})
-                mkvs_renamed += 1
+    plan, skipped = plan_renames(directory, single_folder)
+    if skipped:
+        print("Skipped renaming of (target exists):")
+        for old_path, new_path in skipped:
+            print(f"{old_path} -> {os.path.basename(new_path)}")
+    if dry_run:
+        print(f"{len(plan)} " + ("files" if len(plan) != 1 else "file") + " would be renamed:")
+        for old_path, new_path in plan:
+            print(f"{old_path} -> {os.path.basename(new_path)}")
+        return
+    if not plan:
+        return
+    # Record every rename so the batch can be reverted with --undo_renames
+    undo_name = f"renames_{strftime('%Y%m%d_%H%M%S')}"
+    undo_path = os.path.join(cache_directory, undo_name + ".jsonl")
+    try:
+        os.makedirs(cache_directory, exist_ok=True)
+        suffix = 1
+        while True:
+            try:
+                undo_log = open(undo_path, "x", encoding="utf8") # Never overwrite the log of an earlier run in the same second
+                break
+            except FileExistsError:
+                suffix += 1
+                undo_path = os.path.join(cache_directory, f"{undo_name}_{suffix}.jsonl")
+    except OSError as e:
+        print(f"Error while creating the undo log {undo_path}: {e}\nRenaming without an undo log.")
+        undo_log = None
+    try:
+        done = rename_files(plan, undo_log)
+    finally:
+        if undo_log:
+            undo_log.close()
+    mkvs_renamed += len(done)
+    print(f"Renamed {len(done)} " + ("files" if len(done) != 1 else "file") + (f", undo with --undo_renames \"{undo_path}\"" if undo_log else ""))
+
+def undo_renames(log_path):
+    renames = []
+    with open(log_path, "r", encoding="utf8") as f:
+        for line in f:
+            if line.strip():
+                rename = json.loads(line)
+                renames.append((rename["new"], rename["old"]))
+    renames.reverse()
+    # Only revert renames whose file is still there and whose old name hasn't been taken since
+    missing = [(new_path, old_path) for new_path, old_path in renames if not os.path.isfile(new_path) or os.path.exists(old_path)]
+    for new_path, old_path in missing:
+        print(f"Can't revert {new_path} -> {os.path.basename(old_path)}, the file is missing or the old name is taken.")
+    missing_set = set(missing)
+    done = rename_files([rename for rename in renames if rename not in missing_set])
+    print(f"Reverted {len(done)} of {len(renames)} renames.")
 
 def extract_title(file_path):
     # Try to extract the movie name or tv show episode title from a matching .nfo and use regex on the file title as fallback
@@ -688,6 +1287,176 @@ def extract_title(file_path):
             pass
     return title
 
+def build_category_index(category_dict, mkv_files):
+    # Precompute file count, languages, codecs and paths per category to sort and filter the queue of groups
+    cat_index = {}
+    for position, (cat, paths) in enumerate(category_dict.items()):
+        track_langs = set()
+        track_codecs = set()
+        for file_path in paths:
+            for tracks in mkv_files[file_path].values():
+                for track in tracks:
+                    track_langs.add(track["lang"].lower())
+                    track_codecs.add(track["codec"].lower())
+        cat_index[cat] = {
+            "position": position,
+            "count": len(paths),
+            "langs": track_langs,
+            "codecs": track_codecs,
+            "paths": paths, # Searched file by file, so they don't have to be held in memory a second time
+            "first_path": paths[0]
+        }
+    return cat_index
+
+def category_matches(cat_entry, text):
+    text = text.lower()
+    return text in cat_entry["langs"] or text in cat_entry["codecs"] or any(text in file_path.lower() for file_path in cat_entry["paths"])
+
+def order_categories(categories, cat_index, order):
+    if order == "size":
+        return sorted(categories, key=lambda cat: (-cat_index[cat]["count"], cat_index[cat]["position"]))
+    elif order == "path":
+        return sorted(categories, key=lambda cat: cat_index[cat]["first_path"].lower())
+    else:
+        return sorted(categories, key=lambda cat: cat_index[cat]["position"])
+
+def print_queue(queue, cat_index):
+    print(h_bar)
+    print(f"{len(queue)} " + ("groups" if len(queue) > 1 else "group") + " left:")
+    for number, cat in enumerate(queue[:50], start=1):
+        entry = cat_index[cat]
+        track_langs = " ".join(sorted(entry["langs"]))
+        track_codecs = " ".join(sorted(entry["codecs"]))
+        print(f"{number:3} | {entry['count']:5} | {track_langs[:25]:25} | {track_codecs[:25]:25} | {os.path.basename(entry['first_path'])[:30]}")
+    if len(queue) > 50:
+        print(f"... and {len(queue) - 50} more.")
+    print(h_bar)
+
+def category_id(cat):
+    # Short id of a category that stays the same across runs
+    return hashlib.sha1(cat[0].encode("utf8")).hexdigest()[:12]
+
+def export_tracks(directory, single_folder, export_paths):
+    # Write one row per track of every .mkv file to CSV and/or SQLite, rows are written in batches so memory use stays flat
+    columns = ["path", "title", "category", "track_type", "track_number", "track_id", "language", "name", "codec", "default_flag", "forced", "sdh", "commentary"]
+    csv_files = []
+    databases = []
+    for export_path in export_paths:
+        if export_path.lower().endswith(".csv"):
+            csv_file = open(export_path, "w", newline="", encoding="utf8")
+            csv.writer(csv_file).writerow(columns)
+            csv_files.append(csv_file)
+        else:
+            database = sqlite3.connect(export_path)
+            database.execute("DROP TABLE IF EXISTS tracks")
+            database.execute(f"CREATE TABLE tracks ({', '.join(columns)})")
+            databases.append(database)
+    batch = []
+    file_count = 0
+    track_count = 0
+
+    def write_batch():
+        for csv_file in csv_files:
+            csv.writer(csv_file).writerows(batch)
+        for database in databases:
+            database.executemany(f"INSERT INTO tracks VALUES ({', '.join('?' * len(columns))})", batch)
+            database.commit()
+        batch.clear()
+
+    def add_rows(file_path, track_info):
+        nonlocal file_count, track_count
+        file_count += 1
+        title = extract_title(file_path=file_path)
+        cat = category_id(create_cat(track_info))
+        for tracktype, tracks in track_info.items():
+            for track_number, track in enumerate(tracks, start=1):
+                batch.append((os.path.abspath(file_path), title, cat, tracktype, track_number, track["id"], track["lang"], track["name"], track["codec"],
+                              track.get("default"), track.get("forced"), track.get("sdh"), track.get("comm")))
+                track_count += 1
+        if len(batch) >= 1000:
+            write_batch()
+
+    # Hardlinked files without an .nfo are held back until the scan is done, in case another path of them has one (see prefer_nfo_paths)
+    held_files = {}
+    try:
+        for file_path, track_info, alias_of, device in scan_mkv_files(directory, single_folder):
+            if alias_of: # Export each physical file once
+                if alias_of in held_files and has_nfo(file_path):
+                    add_rows(file_path, held_files.pop(alias_of))
+                continue
+            if not has_nfo(file_path):
+                try:
+                    hardlinked = os.stat(file_path).st_nlink > 1
+                except OSError:
+                    hardlinked = False
+                if hardlinked:
+                    held_files[file_path] = track_info
+                    continue
+            add_rows(file_path, track_info)
+        for file_path, track_info in held_files.items():
+            add_rows(file_path, track_info)
+        write_batch()
+    finally:
+        for csv_file in csv_files:
+            csv_file.close()
+        for database in databases:
+            database.close()
+    print(f"Exported {track_count} tracks of {file_count} mkv files to {', '.join(export_paths)}.")
+
+def write_snapshot(snapshot_path, directory, category_dict, mkv_files, file_aliases):
+    # Write everything needed to prompt on another machine, paths are absolute so they stay valid on the machine that applies the answers
+    base = os.path.abspath(directory)
+    snapshot = {
+        "version": 1,
+        "directory": base,
+        "coarse": coarse_grouping,
+        "mkv_files": {os.path.abspath(file_path): track_info for file_path, track_info in mkv_files.items()},
+        "titles": {os.path.abspath(file_path): extract_title(file_path=file_path) for file_path in mkv_files},
+        "categories": [[cat[0], [os.path.abspath(file_path) for file_path in paths]] for cat, paths in category_dict.items()],
+        "aliases": {os.path.abspath(file_path): [os.path.abspath(alias) for alias in aliases] for file_path, aliases in file_aliases.items()}
+    }
+    with gzip.open(snapshot_path, "wt", encoding="utf8") as f:
+        json.dump(snapshot, f, separators=(",", ":"))
+    print(f"Wrote the snapshot of {len(mkv_files)} mkv files in {len(category_dict)} groups to {snapshot_path}.")
+
+def load_snapshot(snapshot_path):
+    global coarse_grouping
+    with gzip.open(snapshot_path, "rt", encoding="utf8") as f:
+        snapshot = json.load(f)
+    if snapshot.get("version") != 1:
+        print(f"{snapshot_path} is not a snapshot written by this version of the script, exiting.")
+        sys.exit(1)
+    coarse_grouping = snapshot["coarse"] # Categories have to be keyed the same way when the answers are applied
+    category_dict = {(cat,): paths for cat, paths in snapshot["categories"]}
+    return category_dict, snapshot["mkv_files"], snapshot["aliases"], snapshot["titles"]
+
+def save_answers(answers_path, answers):
+    with open(answers_path + ".tmp", "w", encoding="utf8") as f:
+        json.dump({"version": 1, "coarse": coarse_grouping, "answers": answers}, f, indent=1)
+    os.replace(answers_path + ".tmp", answers_path) # Keep the previous answers if writing is interrupted
+
+def load_answers(answers_path):
+    global coarse_grouping
+    with open(answers_path, "r", encoding="utf8") as f:
+        answers = json.load(f)
+    coarse_grouping = answers["coarse"]
+    return answers["answers"]
+
+def apply_answers(answers, category_dict, mkv_files, file_devices=None):
+    # Apply each answer to the files of its group that still have the same tracks, files that changed since the snapshot are left alone
+    not_applied = 0
+    with tqdm(total = len(answers), position=0, desc="Answers", unit=" answers", ncols=100) as pbar:
+        for answer in answers:
+            cat = (answer["category"],)
+            answer_files = set(answer["files"])
+            matching = [file_path for file_path in category_dict.get(cat, []) if os.path.abspath(file_path) in answer_files]
+            not_applied += len(answer_files) - len(matching)
+            if matching:
+                process_category(category_dict={cat: matching}, cat=cat, user_input=answer["input"], mkv_files=mkv_files, file_devices=file_devices)
+            pbar.update(1)
+    if not_applied:
+        print(f"{not_applied} " + ("files were" if not_applied > 1 else "file was") + " not edited because they were moved or their tracks changed since the snapshot.")
+
 def split_inputs(user_input):
     # Divide the input into video, audio and subtitle parts
     video_track = user_input.split(",")[0]
@@ -701,14 +1470,20 @@ def split_inputs(user_input):
         subtitle_tracks = None
     return video_track, audio_tracks, subtitle_tracks
 
-def process_category(category_dict, cat, user_input, mkv_files):
+def process_category(category_dict, cat, user_input, mkv_files, file_devices=None):
     with tqdm(total = len(category_dict[cat]), position=1, desc="Applying changes", unit=" files", ncols=100) as pbar1:
         mkv_count = 0
         # Split the inputs into codes for each track type
         video_track, audio_tracks, subtitle_tracks = split_inputs(user_input=user_input)
         for file_path in category_dict[cat]:
+            device = file_devices.get(file_path) if file_devices is not None else None # Recorded during the scan, no stat needed
+            if device is not None and device in suspended_devices: # Don't touch files on a mount that keeps hanging
+                skipped_files.append((file_path, "device suspended"))
+                pbar1.update(1)
+                continue
             # Try to get the title from a linked .nfo and use regex on the filename as a fallback
             title = extract_title(file_path=file_path)
+            track_info = mkv_files[file_path]
 
             # Base command for mkvpropedit that gives the episode and file its title
             mkvpropedit_cmd = [
@@ -730,7 +1505,7 @@ def process_category(category_dict, cat, user_input, mkv_files):
                     tracknumber = audio_track_number-1
                 elif tracktype == "subtitles":
                     tracknumber = subtitle_track_number-1
-                return mkv_files[file_path][tracktype][tracknumber][trackvar]
+                return track_info[tracktype][tracknumber][trackvar]
             if audio_tracks:
                 for track in audio_tracks:
                     if track == "-":
@@ -771,7 +1546,7 @@ def process_category(category_dict, cat, user_input, mkv_files):
             if subtitle_tracks:
                 if add_sub_format:
                     # fetches a list of subtitle formats and a list of subtitle track names for the given mkv file
-                    sub_formats, sub_names = append_sub_format(mkv_files[file_path])
+                    sub_formats, sub_names = append_sub_format(track_info)
                 for track in subtitle_tracks:
                     if track == "-":
                         mkvpropedit_cmd.extend([
@@ -830,15 +1605,77 @@ def process_category(category_dict, cat, user_input, mkv_files):
                             "--set", f"language={language}",
                         ])
                         subtitle_track_number += 1
-            try:
-                subprocess.run(mkvpropedit_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT) # Execute mkvpropedit to work the magic
+            # Execute mkvpropedit to work the magic
+            if run_tool(mkvpropedit_cmd, edit_timeout, file_path, device) is None:
                 pbar1.update(1)
-                mkv_count += 1
-                global mkvs_edited
-                mkvs_edited += 1
-                pbar1.set_postfix({"mkv files": mkv_count})
-            except subprocess.CalledProcessError as e:
-                print(f"Error while using mkvpropedit on {file_path}: {e}")
+                continue
+            pbar1.update(1)
+            mkv_count += 1
+            global mkvs_edited
+            mkvs_edited += 1
+            pbar1.set_postfix({"mkv files": mkv_count})
+
+def prompt_categories(category_dict, mkv_files, file_aliases, order, find, answers_path=None, answers=None, titles=None, file_devices=None):
+    # Prompt for each group and edit its files, or record the answers if answers_path is given
+    cat_index = build_category_index(category_dict, mkv_files)
+    # Only keep the groups matching all --find filters and sort them according to --order
+    categories = [cat for cat in category_dict if all(category_matches(cat_index[cat], text) for text in find)]
+    if not categories:
+        print(f"No group matches {' and '.join(find)}, exiting.")
+        sys.exit(1)
+    queue = order_categories(categories, cat_index, order)
+
+    with tqdm(total = len(queue), position=0, desc="Categories", unit="cat", ncols=100) as pbar:
+        category_count = 0
+        last_input = ""
+        while queue:
+            cat = queue[0]
+            movies_in_cat = category_dict[cat]
+            # Query user for language codes specific to the category
+            user_input, last_input = getInput(mkv_files=mkv_files,
+                                              movies_in_cat=movies_in_cat,
+                                              category_count=category_count,
+                                              last_input=last_input,
+                                              file_aliases=file_aliases,
+                                              titles=titles)
+            if user_input == "q":
+                print(f"Quitting, {len(queue)} " + ("groups were" if len(queue) > 1 else "group was") + " not edited.")
+                break
+            elif user_input == "l":
+                print_queue(queue, cat_index)
+                input("Press Enter to continue...")
+                continue
+            elif user_input.startswith("j "):
+                # Move the groups matching the text to the front of the queue, keeping their order
+                text = user_input[2:].strip()
+                matching = [c for c in queue if category_matches(cat_index[c], text)]
+                if not matching:
+                    print(f"No remaining group matches {text}.")
+                    sleep(1)
+                matching_set = set(matching)
+                queue = matching + [c for c in queue if c not in matching_set]
+                continue
+            elif user_input.startswith("o "):
+                new_order = user_input[2:].strip()
+                if new_order in ("scan", "size", "path"):
+                    queue = order_categories(queue, cat_index, new_order)
+                else:
+                    print("Unknown order, use size, path or scan.")
+                    sleep(1)
+                continue
+            queue.pop(0)
+            if user_input == "s":
+                print("Skipping current category.")
+                pbar.update(1)
+                category_count += 1
+                continue
+            if answers_path:
+                answers.append({"category": cat[0], "input": user_input, "files": list(category_dict[cat])})
+                save_answers(answers_path, answers)
+            else:
+                process_category(category_dict=category_dict, cat=cat, user_input=user_input, mkv_files=mkv_files, file_devices=file_devices)
+            pbar.update(1)
+            category_count += 1
 
 def main(args):
     args = parse_arguments()
@@ -857,34 +1694,84 @@ def main(args):
     global auto_set_flags
     auto_set_flags = False if args.no_auto_flags or not auto_set_flags_cfg else True
     
+    # --coarse supersedes the config setting
+    global coarse_grouping
+    coarse_grouping = True if args.coarse or coarse_grouping_cfg else False
+
+    if args.snapshot_in:
+        # Prompt from the snapshot only, answers are recorded instead of applied
+        category_dict, mkv_files, file_aliases, titles = load_snapshot(args.snapshot_in)
+        answers_path = args.answers or args.snapshot_in + ".answers.json"
+        answers = []
+        prompt_categories(category_dict, mkv_files, file_aliases, args.order, args.find, answers_path=answers_path, answers=answers, titles=titles)
+        print(f"Recorded {len(answers)} " + ("answers" if len(answers) != 1 else "answer") + f" to {answers_path}, apply them with --apply_answers \"{answers_path}\"")
+        sys.exit(0)
+
     # Check if the required external programs are available on PATH and abort if not
     mkv_tools_on_path()
 
+    # --fingerprint supersedes the config setting
+    global fingerprint_tracks
+    fingerprint_tracks = True if args.fingerprint or fingerprint_tracks_cfg else False
+
+    # Lower the priority and throttle the run to not disturb other users of the system
+    global background
+    background = args.background
+    if background:
+        enter_background_mode()
+
+    # --low_memory supersedes the config setting
+    low_memory = True if args.low_memory or low_memory_cfg else False
+
+    # --no_dir_index supersedes the config setting, the directory index is held in memory so it isn't used with --low_memory
+    global use_dir_index
+    use_dir_index = False if args.no_dir_index or not dir_index_cfg or low_memory else True
+    if use_dir_index:
+        load_dir_index()
+
+    # --no_probe_cache supersedes the config setting
+    if probe_cache_cfg and not args.no_probe_cache:
+        open_probe_cache()
+
+    # Only write the track inventory, don't rename or edit anything
+    if args.export:
+        export_tracks(directory, single_folder, args.export)
+        if use_dir_index:
+            save_dir_index()
+        print_skipped_files() # These files are missing from the export
+        sys.exit(0)
+
+    if args.undo_renames:
+        undo_renames(args.undo_renames)
+        if use_dir_index:
+            save_dir_index()
+        sys.exit(0)
+
+    if args.dry_run_renames:
+        rename_mkv_files(directory, single_folder, dry_run=True)
+        sys.exit(0)
+
     if rename_mkvs:
-        strip_counter(directory, single_folder)
-        rename_to_nfo(directory, single_folder)
+        rename_mkv_files(directory, single_folder)
 
-    category_dict, mkv_files = process_video_files(directory=directory, single_folder=single_folder, create_categories=True)
-    categories = list(category_dict.keys()) # Create a list of categories
+    # The answers decide how the files have to be grouped, so read them before scanning
+    if args.apply_answers:
+        answers = load_answers(args.apply_answers)
 
-    with tqdm(total = len(categories), position=0, desc="Categories", unit="cat", ncols=100) as pbar:
-        category_count = 0
-        last_input = ""
-        for cat in categories:
-            movies_in_cat = [movie for movie in category_dict[cat]]
-            # Query user for language codes specific to the category
-            user_input, last_input = getInput(mkv_files=mkv_files,
-                                              movies_in_cat=movies_in_cat,
-                                              category_count=category_count,
-                                              last_input=last_input)
-            if user_input == "s":
-                print("Skipping current category.")
-                pbar.update(1)
-                category_count += 1
-                continue
-            process_category(category_dict=category_dict, cat=cat, user_input=user_input, mkv_files=mkv_files)
-            pbar.update(1)
-            category_count += 1
+    category_dict, mkv_files, file_aliases, file_devices = process_video_files(directory=directory, single_folder=single_folder, create_categories=True, low_memory=low_memory)
+    if use_dir_index:
+        save_dir_index()
+
+    if args.snapshot_out:
+        write_snapshot(args.snapshot_out, directory, category_dict, mkv_files, file_aliases)
+        print_skipped_files() # These files are missing from the snapshot
+        sys.exit(0)
+
+    if args.apply_answers:
+        apply_answers(answers, category_dict, mkv_files, file_devices)
+    else:
+        prompt_categories(category_dict, mkv_files, file_aliases, args.order, args.find, file_devices=file_devices)
+    print_skipped_files()
     exit_time = 1
     print(f"Renamed {mkvs_renamed} and edited {mkvs_edited} mkv files. Exiting in {exit_time} " + ("second." if exit_time == 1 else "seconds."))
     sleep(exit_time)
@@ -895,6 +1782,7 @@ if __name__ == "__main__":
     try:
         main(args)
     except KeyboardInterrupt:
+        print_skipped_files()
         print("Interrupted, exiting.")
         try:
             sys.exit(130)